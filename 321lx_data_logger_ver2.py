@@ -3,23 +3,111 @@ import serial.tools.list_ports
 import tkinter as tk
 from tkinter import ttk, filedialog, messagebox
 import csv
+import io
 import threading
+import queue
 import time
 import datetime
 import re
 import os
+import mmap
+import functools
 import json
 import platform
 import subprocess
 import smtplib
-from email.mime.multipart import MIMEMultipart
-from email.mime.text import MIMEText
-from email.mime.base import MIMEBase
-from email import encoders
+from concurrent.futures import ThreadPoolExecutor
+from email.message import EmailMessage, MIMEPart
 import socket
+from array import array
+
+# Both helpers return UTF-8 bytes; JSON files are read back with encoding='utf-8'
+try:
+    import orjson
+    _json_dumps = orjson.dumps
+
+    def _json_dumps_pretty(obj):
+        return orjson.dumps(obj, option=orjson.OPT_INDENT_2)
+except ImportError:
+    def _json_dumps(obj):
+        return json.dumps(obj).encode()
+
+    def _json_dumps_pretty(obj):
+        return json.dumps(obj, indent=2).encode()
+
+def _write_json_atomic(path, obj):
+    # Write next to the target and swap it in, so a crash never leaves a half-written file
+    tmp_path = path + ".tmp"
+    with open(tmp_path, 'wb') as f:
+        f.write(_json_dumps_pretty(obj))
+    os.replace(tmp_path, path)
+
+try:
+    # SIMD base64 codec; same output as the stdlib encoder
+    from pybase64 import encodebytes as _b64_encodebytes
+except ImportError:
+    from base64 import encodebytes as _b64_encodebytes
+
+# A multiple of 57 input bytes encodes to whole 76-character base64 lines
+_B64_CHUNK = 57 * 16384
+
+def _base64_file(path):
+    # Encode straight out of a read-only mapping of the file, chunk by chunk, so the raw
+    # file is never copied into memory next to its encoding.
+    # The output buffer is sized up front: 77 bytes per full 57-byte line plus the short last line.
+    with open(path, 'rb') as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return ''  # empty files cannot be mapped
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm, memoryview(mm) as view:
+            full_lines, tail = divmod(len(mm), 57)
+            encoded = bytearray(full_lines * 77 + ((tail + 2) // 3 * 4 + 1 if tail else 0))
+            pos = 0
+            for start in range(0, len(mm), _B64_CHUNK):
+                lines = _b64_encodebytes(view[start:start + _B64_CHUNK])
+                encoded[pos:pos + len(lines)] = lines
+                pos += len(lines)
+    return encoded.decode('ascii')
+
+@functools.lru_cache(maxsize=2)
+def _encoded_attachment(path, mtime_ns, size):
+    # Keyed on the file's mtime and size so a re-exported file is encoded afresh
+    return _base64_file(path)
+
+_STRIP_RE = re.compile(r'[^\d\+-\.gk]')
+_WEIGHT_RE = re.compile(r'([+-]?\d+\.\d+)')
+
+_HELP_TEXTS = {
+    'presets': "Select a preconfigured scale profile.\nRight-click to manage presets.",
+    'com_port': "1. Connect scale via USB/RS232\n2. Click refresh (↻) to scan ports\n3. Select detected port",
+    'baud_rate': "Communication speed (bits per second)\nDefault: 9600 for Precisa",
+    'data_bits': "Number of data bits per character\nPrecisa: 7, Most devices: 8",
+    'parity': "Error checking method\nPrecisa: ODD, Common: NONE",
+    'flow_control': "Data flow management\nXON/XOFF: Software\nHARDWARE: RTS/CTS",
+    'export': "Export data to CSV\nAppends to existing file with timestamp",
+    'connection': "Connect/Disconnect from scale\nVerify parameters first",
+    'new_preset': "Create new preset from current settings",
+    'email': "Send data via email\nRequires SMTP server configuration",
+    'smtp_settings': "Configure email server settings\nFor Gmail, use an App Password",
+    'skip_repeats': "Ignore a reading identical to the previous one\nUse when the scale streams continuously"
+}
 
 class BalanceLogger:
-    TEMP_FILE = "balance_data.tmp.json"
+    TEMP_FILE = "balance_data.tmp.jsonl"
+    LEGACY_TEMP_FILE = "balance_data.tmp.json"  # single-document format used by earlier versions
+    CHECKPOINT_EVERY = 50  # samples
+    CHECKPOINT_INTERVAL = 2.0  # seconds
+    PARITY_MAP = {
+        'NONE': serial.PARITY_NONE,
+        'EVEN': serial.PARITY_EVEN,
+        'ODD': serial.PARITY_ODD,
+        'MARK': serial.PARITY_MARK,
+        'SPACE': serial.PARITY_SPACE
+    }
+    FLOWCONTROL_MAP = {
+        'NONE': {'xonxoff': False, 'rtscts': False},
+        'XON/XOFF': {'xonxoff': True, 'rtscts': False},
+        'HARDWARE': {'xonxoff': False, 'rtscts': True}
+    }
 
     def __init__(self, root):
         self.root = root
@@ -30,7 +118,12 @@ class BalanceLogger:
         # Presets and email settings
         self.presets_file = "scale_presets.json"
         self.presets = self.load_presets()
+        self._presets_after = None
+        self._presets_snapshot = None
+        self._presets_lock = threading.Lock()
         self.email_settings_file = "email_settings.json"
+        self._email_settings_cache = None  # (mtime, settings)
+        self._email_settings_dirty = False  # defaults held in memory, not yet on disk
         self.email_settings = self.load_email_settings()
 
         # Serial parameters
@@ -61,41 +154,150 @@ class BalanceLogger:
         # App state
         self.serial_port = None
         self.tcp_socket = None
-        self.data = []
+        self.clear_samples()
         self.file_path = tk.StringVar(value="balance_data.csv")
+        self._exported_path = None
         self.sample_counter = 1
         self.read_thread = None
         self.device_name = tk.StringVar(value="")
+        self.skip_repeats = tk.BooleanVar(value=False)
+        self._skip_repeats = False  # plain mirror of skip_repeats for the reader threads
+        self._last_raw = None
+        self._checkpointed = 0
+        self._last_checkpoint_t = 0.0
+        self._checkpoint_after = None
+        self._sample_q = queue.Queue()
+        self._pending_rows = []
+        self._smtp = None
+        self._smtp_key = None
+        # One worker: sends share the cached SMTP session, so they run one at a time anyway
+        self._send_pool = ThreadPoolExecutor(max_workers=1)
+        self._smtp_lock = threading.Lock()
+        self._closed = False
 
         # UI
         self.create_ui()
         self.refresh_ports()
-        self.create_help_messages()
-        self.root.bind("<Configure>", self.on_window_resize)
         self.load_temp_data()
+        self.root.after(50, self.drain_samples)
+        self.root.protocol("WM_DELETE_WINDOW", self.on_close)
+
+    def on_close(self):
+        self.flush_temp_data()
+        if self._presets_after is not None:
+            self.root.after_cancel(self._presets_after)
+            self.flush_presets(background=False)
+        self._closed = True
+        self._send_pool.shutdown(wait=False, cancel_futures=True)
+        # Don't wait out a send in progress; its session is dropped when the process exits
+        if self._smtp_lock.acquire(blocking=False):
+            try:
+                self.close_smtp()
+            finally:
+                self._smtp_lock.release()
+        self.root.destroy()
+
+    # --- Sample Storage ---
+    # Samples are stored column-wise; _iid_to_idx maps a Treeview row id to its index.
+    def clear_samples(self):
+        self.sample_names = []
+        self.weights = array('d')
+        self.units = []
+        self.devices = []
+        self.comments = []
+        self.iids = []
+        self._iid_to_idx = {}
+        self._dirty = True  # samples changed since the last export
+
+    def append_sample(self, sample_name, weight, unit, device, comment, iid):
+        self._iid_to_idx[iid] = len(self.iids)
+        self.sample_names.append(sample_name)
+        self.weights.append(weight)
+        self.units.append(unit)
+        self.devices.append(device)
+        self.comments.append(comment)
+        self.iids.append(iid)
+        self._dirty = True
+
+    def sample_records(self, start, end):
+        return [
+            {"sample_name": n, "weight": w, "unit": u, "device": d, "comments": c, "iid": i}
+            for n, w, u, d, c, i in zip(
+                self.sample_names[start:end], self.weights[start:end], self.units[start:end],
+                self.devices[start:end], self.comments[start:end], self.iids[start:end]
+            )
+        ]
 
     # --- Crash Recovery ---
+    # The temp file is JSON lines: each line carries the samples added since the
+    # previous line, so a checkpoint costs O(new samples) instead of O(all samples).
     def save_temp_data(self):
+        if (len(self.iids) - self._checkpointed < self.CHECKPOINT_EVERY
+                and time.monotonic() - self._last_checkpoint_t < self.CHECKPOINT_INTERVAL):
+            if self._checkpoint_after is None:
+                self._checkpoint_after = self.root.after(int(self.CHECKPOINT_INTERVAL * 1000), self.flush_temp_data)
+            return
+        self.flush_temp_data()
+
+    def flush_temp_data(self, rewrite=False):
+        if self._checkpoint_after is not None:
+            self.root.after_cancel(self._checkpoint_after)
+            self._checkpoint_after = None
+        start = 0 if rewrite else self._checkpointed
+        end = len(self.iids)
+        if start == end and not rewrite:
+            return
         try:
-            with open(self.TEMP_FILE, "w") as f:
-                json.dump({
-                    "data": self.data,
-                    "sample_counter": self.sample_counter,
-                    "device_name": self.device_name.get()
-                }, f)
+            line = _json_dumps({
+                "data": self.sample_records(start, end),
+                "sample_counter": self.sample_counter,
+                "device_name": self.device_name.get()
+            }) + b"\n"
+            if rewrite:
+                # Replace rather than truncate, so a crash mid-write keeps the previous checkpoint
+                tmp_path = self.TEMP_FILE + ".tmp"
+                with open(tmp_path, "wb") as f:
+                    f.write(line)
+                os.replace(tmp_path, self.TEMP_FILE)
+            else:
+                with open(self.TEMP_FILE, "ab") as f:
+                    f.write(line)
+            self._checkpointed = end
         except Exception as e:
             print(f"Failed to save temp data: {e}")
+        self._last_checkpoint_t = time.monotonic()
 
     def load_temp_data(self):
-        if os.path.exists(self.TEMP_FILE):
+        legacy = not os.path.exists(self.TEMP_FILE)
+        if not legacy or os.path.exists(self.LEGACY_TEMP_FILE):
             try:
-                with open(self.TEMP_FILE, "r") as f:
-                    temp = json.load(f)
+                data, temp = [], {}
+                if legacy:
+                    with open(self.LEGACY_TEMP_FILE, "r", encoding='utf-8') as f:
+                        temp = json.load(f)
+                    data = temp.get("data", [])
+                else:
+                    with open(self.TEMP_FILE, "r", encoding='utf-8') as f:
+                        for line in f:
+                            try:
+                                temp = json.loads(line)
+                            except ValueError:
+                                break  # torn final line from a crash mid-write
+                            data.extend(temp.get("data", []))
                 if messagebox.askyesno("Restore Session", "Restore previous unsaved session?"):
-                    self.data = temp.get("data", [])
+                    self.clear_samples()
+                    for rec in data:
+                        self.append_sample(rec["sample_name"], rec["weight"], rec["unit"],
+                                           rec.get("device", ""), rec["comments"], rec.get("iid"))
+                    self._checkpointed = len(data)
                     self.sample_counter = temp.get("sample_counter", 1)
                     self.device_name.set(temp.get("device_name", ""))
                     self.refresh_table()
+                    # Rewrite from memory: drops a torn last line, which later appends would
+                    # otherwise be glued onto, and moves a legacy session to the new format
+                    self.flush_temp_data(rewrite=True)
+                    if legacy:
+                        os.remove(self.LEGACY_TEMP_FILE)
                     self.show_status("Session restored from crash recovery.", color="blue")
                 else:
                     self.clear_temp_data()
@@ -103,9 +305,14 @@ class BalanceLogger:
                 print(f"Failed to load temp data: {e}")
 
     def clear_temp_data(self):
+        if self._checkpoint_after is not None:
+            self.root.after_cancel(self._checkpoint_after)
+            self._checkpoint_after = None
+        self._checkpointed = 0
         try:
-            if os.path.exists(self.TEMP_FILE):
-                os.remove(self.TEMP_FILE)
+            for path in (self.TEMP_FILE, self.LEGACY_TEMP_FILE):
+                if os.path.exists(path):
+                    os.remove(path)
         except Exception as e:
             print(f"Failed to delete temp data: {e}")
 
@@ -207,6 +414,9 @@ class BalanceLogger:
         self.status_indicator = self.status_canvas.create_oval(2, 2, 18, 18, fill='grey')
         self.status_label = ttk.Label(status_frame, text="Not Connected")
         self.status_label.pack(side=tk.LEFT, padx=5)
+        self.add_help_button(status_frame, 'skip_repeats').pack(side=tk.RIGHT, padx=5)
+        ttk.Checkbutton(status_frame, text="Ignore repeated readings", variable=self.skip_repeats,
+                        command=lambda: setattr(self, '_skip_repeats', self.skip_repeats.get())).pack(side=tk.RIGHT)
 
         # --- Data management controls ---
         log_frame = ttk.LabelFrame(parent, text="Data Management", padding="10")
@@ -255,29 +465,31 @@ class BalanceLogger:
 
     def reset_data(self):
         if messagebox.askyesno("Reset All Data", "Are you sure you want to clear all data and reset the sample counter?"):
-            self.data.clear()
+            self.clear_samples()
             self.sample_counter = 1
             self.device_name.set("")
-            for i in self.tree.get_children():
-                self.tree.delete(i)
+            self._pending_rows = []
+            self._last_raw = None
+            self.tree.delete(*self.tree.get_children())
             self.current_weight.config(text="0.000 g")
             self.clear_temp_data()
             self.show_status("All data cleared and sample counter reset.", color="red")
 
     def refresh_table(self):
-        for i in self.tree.get_children():
-            self.tree.delete(i)
-        for row in self.data:
-            values = (
-                row["sample_name"],
-                f"{row['weight']:.3f}",
-                row["unit"],
-                row.get("device", ""),
-                row["comments"]
-            )
-            self.tree.insert("", "end", values=values)
-        if self.data:
-            self.current_weight.config(text=f"{self.data[-1]['weight']:.3f} {self.data[-1]['unit']}")
+        self.tree.delete(*self.tree.get_children())
+        # Locals for the per-row loop, which can run over thousands of restored samples
+        insert = self.tree.insert
+        iids = self.iids
+        iid_to_idx = self._iid_to_idx = {}
+        # Reuse the stored row ids so restored rows keep the iids they were checkpointed with
+        rows = zip(iids, self.sample_names, self.weights, self.units, self.devices, self.comments)
+        for idx, (iid, sample_name, weight, unit, device, comment) in enumerate(rows):
+            weight_text = f"{weight:.3f}"
+            iid = insert("", "end", iid=iid, values=(sample_name, weight_text, unit, device, comment))
+            iids[idx] = iid
+            iid_to_idx[iid] = idx
+        if self.iids:
+            self.current_weight.config(text=f"{weight_text} {unit}")
         else:
             self.current_weight.config(text="0.000 g")
 
@@ -293,26 +505,20 @@ class BalanceLogger:
         if self.connection_type.get() == "Serial":
             if self.serial_port is None:
                 try:
-                    parity_map = {
-                        'NONE': serial.PARITY_NONE,
-                        'EVEN': serial.PARITY_EVEN,
-                        'ODD': serial.PARITY_ODD,
-                        'MARK': serial.PARITY_MARK,
-                        'SPACE': serial.PARITY_SPACE
-                    }
-                    flowcontrol_map = {
-                        'NONE': {'xonxoff': False, 'rtscts': False},
-                        'XON/XOFF': {'xonxoff': True, 'rtscts': False},
-                        'HARDWARE': {'xonxoff': False, 'rtscts': True}
-                    }
+                    parity = self.serial_params['parity'].get()
+                    if parity not in self.PARITY_MAP:
+                        raise ValueError(f"Unknown parity '{parity}'")
+                    flowcontrol = self.serial_params['flowcontrol'].get()
+                    if flowcontrol not in self.FLOWCONTROL_MAP:
+                        raise ValueError(f"Unknown flow control '{flowcontrol}'")
                     self.serial_port = serial.Serial(
                         port=self.port_cb.get(),
                         baudrate=self.serial_params['baudrate'].get(),
                         bytesize=self.serial_params['bytesize'].get(),
-                        parity=parity_map[self.serial_params['parity'].get()],
+                        parity=self.PARITY_MAP[parity],
                         stopbits=self.serial_params['stopbits'].get(),
-                        **flowcontrol_map[self.serial_params['flowcontrol'].get()],
-                        timeout=2
+                        **self.FLOWCONTROL_MAP[flowcontrol],
+                        timeout=None
                     )
                     self.connect_btn.config(text="Disconnect")
                     self.update_status("Connected", 'green')
@@ -322,8 +528,10 @@ class BalanceLogger:
                     self.update_status(f"Error: {str(e)}", 'red')
                     messagebox.showerror("Connection Error", str(e))
             else:
-                self.serial_port.close()
-                self.serial_port = None
+                port, self.serial_port = self.serial_port, None
+                # Wakes the reader thread, which is blocked in read()
+                port.cancel_read()
+                port.close()
                 self.connect_btn.config(text="Connect")
                 self.update_status("Not Connected", 'grey')
         else:
@@ -332,6 +540,8 @@ class BalanceLogger:
                     self.tcp_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
                     self.tcp_socket.settimeout(5)
                     self.tcp_socket.connect((self.tcp_ip.get(), self.tcp_port.get()))
+                    # The timeout only bounds connect(); the reader blocks until data or disconnect
+                    self.tcp_socket.settimeout(None)
                     self.eth_connect_btn.config(text="Disconnect")
                     self.update_status("Connected (Ethernet)", 'green')
                     self.read_thread = threading.Thread(target=self.read_tcp, daemon=True)
@@ -341,87 +551,126 @@ class BalanceLogger:
                     messagebox.showerror("Ethernet Error", str(e))
                     self.tcp_socket = None
             else:
+                try:
+                    # Wakes the reader thread, which is blocked in recv()
+                    self.tcp_socket.shutdown(socket.SHUT_RDWR)
+                except OSError:
+                    pass
                 self.tcp_socket.close()
                 self.tcp_socket = None
                 self.eth_connect_btn.config(text="Connect")
                 self.update_status("Not Connected", 'grey')
 
     def update_status(self, text, color='grey'):
-        self.status_canvas.itemconfig(self.status_indicator, fill=color)
-        self.status_label.config(text=text)
-        self.root.update_idletasks()
-        self.show_status(text, color=color)
+        # Also called from the reader threads: post the change to the Tk thread
+        def apply():
+            self.status_canvas.itemconfig(self.status_indicator, fill=color)
+            self.status_label.config(text=text)
+            self.show_status(text, color=color)
+        self.root.after(0, apply)
+
+    def post_to_ui(self, func, *args):
+        # For worker thread callbacks, which can finish after the window is destroyed
+        if self._closed:
+            return
+        try:
+            self.root.after(0, func, *args)
+        except (RuntimeError, tk.TclError):
+            pass
 
     def read_serial(self):
-        buffer = ""
-        while self.serial_port and self.serial_port.is_open:
+        port = self.serial_port
+        buffer = bytearray()
+        while self.serial_port is port and port.is_open:
             try:
-                bytes_to_read = self.serial_port.in_waiting
-                if bytes_to_read > 0:
-                    raw_data = self.serial_port.read(bytes_to_read)
-                    buffer += raw_data.decode('ascii', errors='replace')
-                    while '\r\n' in buffer:
-                        line, buffer = buffer.split('\r\n', 1)
+                # Sleep in the driver until at least one byte arrives (or the read is
+                # cancelled on disconnect), then take everything already buffered.
+                raw_data = port.read(port.in_waiting or 1)
+                if raw_data:
+                    buffer += raw_data
+                    end = buffer.find(b'\r\n')
+                    while end >= 0:
+                        line = buffer[:end].decode('ascii', errors='replace')
+                        del buffer[:end + 2]
                         self.process_data(line.strip())
-                        self.save_temp_data()
-                time.sleep(0.1)
+                        end = buffer.find(b'\r\n')
             except serial.SerialException:
-                self.update_status("Connection Lost", 'red')
+                if self.serial_port is port:
+                    self.update_status("Connection Lost", 'red')
                 break
             except Exception as e:
                 print(f"Serial error: {str(e)}")
                 break
 
     def read_tcp(self):
-        buffer = ""
-        while self.tcp_socket:
-            try:
-                data = self.tcp_socket.recv(1024)
-                if not data:
-                    break
-                buffer += data.decode('ascii', errors='replace')
-                while '\r\n' in buffer:
-                    line, buffer = buffer.split('\r\n', 1)
-                    self.process_data(line.strip())
-                    self.save_temp_data()
-                time.sleep(0.1)
-            except socket.error as e:
-                self.update_status(f"TCP Error: {e}", 'red')
-                break
-            except Exception as e:
-                print(f"TCP error: {str(e)}")
-                break
+        try:
+            with self.tcp_socket.makefile('rb', buffering=8192) as stream:
+                for raw_line in stream:
+                    if not raw_line.endswith(b'\r\n'):
+                        continue
+                    self.process_data(raw_line[:-2].decode('ascii', errors='replace').strip())
+        except socket.error as e:
+            self.update_status(f"TCP Error: {e}", 'red')
+        except Exception as e:
+            print(f"TCP error: {str(e)}")
 
     def process_data(self, data):
+        # A stable pan streams the same line over and over; optionally drop the repeats
+        if self._skip_repeats and data == self._last_raw:
+            return
+        self._last_raw = data
         try:
-            clean_data = re.sub(r'[^\d\+-\.gk]', '', data)
+            clean_data = _STRIP_RE.sub('', data)
             if not clean_data:
                 return
-            weight_match = re.search(r'([+-]?\d+\.\d+)', clean_data)
+            weight_match = _WEIGHT_RE.search(clean_data)
             if not weight_match:
                 return
             weight = float(weight_match.group(1))
-            unit = 'g' if 'g' in clean_data.lower() else 'kg' if 'kg' in clean_data.lower() else '?'
-            sample_name = f"Sample_{self.sample_counter}"
-            self.sample_counter += 1
-            device = self.presets_combo.get() or self.device_name.get() or "Unknown"
-            self.device_name.set(device)
-            values = (sample_name, f"{weight:.3f}", unit, device, "")
-            iid = self.tree.insert("", "end", values=values)
-            self.data.append({
-                "sample_name": sample_name,
-                "weight": weight,
-                "unit": unit,
-                "device": device,
-                "comments": "",
-                "iid": iid
-            })
-            self.tree.yview_moveto(1)
-            self.current_weight.config(text=f"{weight:.3f} {unit}")
-            self.save_temp_data()
+            # clean_data only keeps lowercase letters, so no lower() is needed
+            unit = 'kg' if 'kg' in clean_data else 'g' if 'g' in clean_data else '?'
+            # Runs on the reader thread: hand the parsed sample to the Tk thread
+            self._sample_q.put((weight, unit))
         except Exception as e:
             print(f"Data processing error: {str(e)}")
 
+    def drain_samples(self):
+        self.root.after(50, self.drain_samples)
+        appended = False
+        try:
+            while True:
+                weight, unit = self._sample_q.get_nowait()
+                self.append_record(weight, unit)
+                appended = True
+        except queue.Empty:
+            pass
+        if appended:
+            self.flush_ui()
+            self.save_temp_data()
+
+    def append_record(self, weight, unit):
+        sample_name = f"Sample_{self.sample_counter}"
+        iid = f"S{self.sample_counter}"
+        self.sample_counter += 1
+        device = self.presets_combo.get() or self.device_name.get() or "Unknown"
+        self.device_name.set(device)
+        self._pending_rows.append(len(self.iids))
+        self.append_sample(sample_name, weight, unit, device, "", iid)
+
+    def flush_ui(self):
+        rows, self._pending_rows = self._pending_rows, []
+        if not rows:
+            return
+        insert = self.tree.insert
+        sample_names, weights, units, devices, comments, iids = (
+            self.sample_names, self.weights, self.units, self.devices, self.comments, self.iids)
+        for idx in rows:
+            weight_text = f"{weights[idx]:.3f}"
+            insert("", "end", iid=iids[idx], values=(sample_names[idx], weight_text, units[idx], devices[idx], comments[idx]))
+        self.tree.yview_moveto(1)
+        # The label shows the newest sample, whose weight was just formatted for its row
+        self.current_weight.config(text=f"{weight_text} {units[idx]}")
+
     def on_treeview_double_click(self, event):
         region = self.tree.identify("region", event.x, event.y)
         if region != "cell":
@@ -441,36 +690,33 @@ class BalanceLogger:
         def save_edit(event=None):
             new_value = entry.get()
             self.tree.set(rowid, column=self.tree["columns"][col_idx], value=new_value)
-            for item in self.data:
-                if item["iid"] == rowid:
-                    if col_idx == 0:
-                        item["sample_name"] = new_value
-                    else:
-                        item["comments"] = new_value
-                    break
+            idx = self._iid_to_idx.get(rowid)
+            if idx is not None:
+                (self.sample_names if col_idx == 0 else self.comments)[idx] = new_value
+                self._dirty = True
             entry.destroy()
-            self.save_temp_data()
+            self.flush_temp_data(rewrite=True)
         entry.bind("<Return>", save_edit)
         entry.bind("<FocusOut>", save_edit)
 
     def save_data(self):
-        if not self.data:
+        if not self.iids:
             messagebox.showinfo("Info", "No data to export")
             return
         try:
-            with open(self.file_path.get(), 'a', newline='') as f:
-                writer = csv.writer(f)
-                export_time = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S %Z")
-                writer.writerow([f"Exported: {export_time}"])
-                writer.writerow(["Sample Name", "Weight", "Units", "Device", "Comments"])
-                for row in self.data:
-                    writer.writerow([
-                        row["sample_name"],
-                        row["weight"],
-                        row["unit"],
-                        row.get("device", ""),
-                        row["comments"]
-                    ])
+            # Format the whole export in memory and hand it to the OS in one write.
+            buf = io.StringIO()
+            writer = csv.writer(buf)
+            export_time = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S %Z")
+            writer.writerow([f"Exported: {export_time}"])
+            writer.writerow(["Sample Name", "Weight", "Units", "Device", "Comments"])
+            writer.writerows(zip(self.sample_names, self.weights, self.units, self.devices, self.comments))
+            with open(self.file_path.get(), 'a', newline='', buffering=1024 * 1024) as f:
+                f.write(buf.getvalue())
+                f.flush()
+                os.fsync(f.fileno())
+            self._dirty = False
+            self._exported_path = self.file_path.get()
             messagebox.showinfo("Success", f"Data exported to {self.file_path.get()}")
             self.show_status("Data exported.", color="green")
         except Exception as e:
@@ -492,11 +738,11 @@ class BalanceLogger:
             messagebox.showerror("Error", f"Failed to open file: {str(e)}")
 
     def add_help_button(self, parent, help_key):
-        return ttk.Button(parent, text="?", width=2, command=lambda: messagebox.showinfo("Help", self.help_texts[help_key]))
+        return ttk.Button(parent, text="?", width=2, command=lambda: messagebox.showinfo("Help", _HELP_TEXTS[help_key]))
 
     def load_presets(self):
         try:
-            with open(self.presets_file, 'r') as f:
+            with open(self.presets_file, 'r', encoding='utf-8') as f:
                 return json.load(f)
         except FileNotFoundError:
             default_presets = {
@@ -568,26 +814,45 @@ class BalanceLogger:
                 messagebox.showerror("Error", "Invalid numeric values")
                 return
             self.presets[preset_name] = new_preset
-            try:
-                with open(self.presets_file, 'w') as f:
-                    json.dump(self.presets, f, indent=2)
-                self.presets_combo['values'] = list(self.presets.keys())
-                preset_dialog.destroy()
-            except Exception as e:
-                messagebox.showerror("Save Error", f"Failed to save preset: {str(e)}")
+            self.presets_combo['values'] = list(self.presets.keys())
+            self.schedule_presets_save()
+            preset_dialog.destroy()
         ttk.Button(preset_dialog, text="Save", command=save_preset).grid(row=6, columnspan=2, pady=10)
 
     def delete_preset(self):
         selected = self.presets_combo.get()
         if selected and selected in self.presets:
             del self.presets[selected]
+            self.presets_combo['values'] = list(self.presets.keys())
+            self.presets_combo.set('')
+            self.schedule_presets_save()
+
+    def schedule_presets_save(self):
+        # Debounce: a burst of preset edits results in a single write
+        if self._presets_after is not None:
+            self.root.after_cancel(self._presets_after)
+        self._presets_after = self.root.after(500, self.flush_presets)
+
+    def flush_presets(self, background=True):
+        self._presets_after = None
+        self._presets_snapshot = {name: dict(preset) for name, preset in self.presets.items()}
+        if background:
+            threading.Thread(target=self.write_presets, daemon=True).start()
+        else:
+            self.write_presets(background=False)
+
+    def write_presets(self, background=True):
+        # Writers read the snapshot under the lock, so the last one to run writes the newest presets
+        with self._presets_lock:
             try:
-                with open(self.presets_file, 'w') as f:
-                    json.dump(self.presets, f, indent=2)
-                self.presets_combo['values'] = list(self.presets.keys())
-                self.presets_combo.set('')
+                _write_json_atomic(self.presets_file, self._presets_snapshot)
             except Exception as e:
-                messagebox.showerror("Delete Error", f"Failed to delete preset: {str(e)}")
+                error = f"Failed to save presets: {str(e)}"
+                if background:
+                    # Tk calls must run on the Tk thread, and the window may be closing
+                    self.post_to_ui(messagebox.showerror, "Save Error", error)
+                else:
+                    messagebox.showerror("Save Error", error)
 
     def show_presets_menu(self, event):
         self.presets_menu.post(event.x_root, event.y_root)
@@ -605,21 +870,18 @@ class BalanceLogger:
         email_frame = ttk.LabelFrame(parent, text="Email Settings", padding="10")
         email_frame.pack(fill=tk.BOTH, expand=True, padx=10, pady=10)
         email_frame.columnconfigure(1, weight=1)
-        ttk.Label(email_frame, text="SMTP Server:").grid(row=0, column=0, padx=5, pady=5, sticky='w')
-        ttk.Entry(email_frame, textvariable=self.email_params['smtp_server']).grid(row=0, column=1, padx=5, pady=5, sticky='ew')
-        ttk.Label(email_frame, text="SMTP Port:").grid(row=1, column=0, padx=5, pady=5, sticky='w')
-        ttk.Entry(email_frame, textvariable=self.email_params['smtp_port']).grid(row=1, column=1, padx=5, pady=5, sticky='ew')
-        ttk.Label(email_frame, text="Username:").grid(row=2, column=0, padx=5, pady=5, sticky='w')
-        ttk.Entry(email_frame, textvariable=self.email_params['username']).grid(row=2, column=1, padx=5, pady=5, sticky='ew')
-        ttk.Label(email_frame, text="Password:").grid(row=3, column=0, padx=5, pady=5, sticky='w')
-        password_entry = ttk.Entry(email_frame, textvariable=self.email_params['password'], show="*")
-        password_entry.grid(row=3, column=1, padx=5, pady=5, sticky='ew')
-        ttk.Label(email_frame, text="Default Sender:").grid(row=4, column=0, padx=5, pady=5, sticky='w')
-        ttk.Entry(email_frame, textvariable=self.email_params['sender']).grid(row=4, column=1, padx=5, pady=5, sticky='ew')
-        ttk.Label(email_frame, text="Default Recipient:").grid(row=5, column=0, padx=5, pady=5, sticky='w')
-        ttk.Entry(email_frame, textvariable=self.email_params['default_recipient']).grid(row=5, column=1, padx=5, pady=5, sticky='ew')
-        ttk.Label(email_frame, text="Default Subject:").grid(row=6, column=0, padx=5, pady=5, sticky='w')
-        ttk.Entry(email_frame, textvariable=self.email_params['default_subject']).grid(row=6, column=1, padx=5, pady=5, sticky='ew')
+        fields = [
+            ("SMTP Server:", 'smtp_server'),
+            ("SMTP Port:", 'smtp_port'),
+            ("Username:", 'username'),
+            ("Password:", 'password'),
+            ("Default Sender:", 'sender'),
+            ("Default Recipient:", 'default_recipient'),
+            ("Default Subject:", 'default_subject')
+        ]
+        for row, (label, param) in enumerate(fields):
+            ttk.Label(email_frame, text=label).grid(row=row, column=0, padx=5, pady=5, sticky='w')
+            ttk.Entry(email_frame, textvariable=self.email_params[param], show="*" if param == 'password' else "").grid(row=row, column=1, padx=5, pady=5, sticky='ew')
         ttk.Label(email_frame, text="Default Message:").grid(row=7, column=0, padx=5, pady=5, sticky='w')
         message_frame = ttk.Frame(email_frame)
         message_frame.grid(row=7, column=1, padx=5, pady=5, sticky='ew')
@@ -645,26 +907,32 @@ class BalanceLogger:
         ttk.Label(note_frame, text=note_text, wraplength=600, justify="left").pack(fill=tk.X)
 
     def test_email_connection(self):
+        # Runs on the send pool so a send in progress doesn't block the UI
         try:
-            server = smtplib.SMTP(
-                self.email_params['smtp_server'].get(),
-                self.email_params['smtp_port'].get()
-            )
-            server.starttls()
-            server.login(
-                self.email_params['username'].get(),
-                self.email_params['password'].get()
-            )
-            server.quit()
-            messagebox.showinfo("Success", "SMTP connection successful!")
-        except Exception as e:
+            params = {k: v.get() for k, v in self.email_params.items()}
+        except tk.TclError as e:  # e.g. a non-numeric SMTP port
             messagebox.showerror("Connection Error", f"Failed to connect: {str(e)}")
+            return
+        def connect():
+            with self._smtp_lock:
+                self.get_smtp(params)
+        def report(future):
+            try:
+                future.result()
+            except Exception as e:
+                messagebox.showerror("Connection Error", f"Failed to connect: {str(e)}")
+                return
+            messagebox.showinfo("Success", "SMTP connection successful!")
+        future = self._send_pool.submit(connect)
+        future.add_done_callback(lambda f: self.post_to_ui(report, f))
 
     def send_email(self):
-        if not self.data:
+        if not self.iids:
             messagebox.showerror("Error", "No data to send. Please log some weight measurements first.")
             return
-        self.save_data()
+        # Only export again if the file on disk is behind the table
+        if self._dirty or self._exported_path != self.file_path.get() or not os.path.exists(self._exported_path):
+            self.save_data()
         email_dialog = tk.Toplevel(self.root)
         email_dialog.title("Send Data via Email")
         email_dialog.grab_set()
@@ -682,45 +950,115 @@ class BalanceLogger:
         message.insert("1.0", self.email_params['default_message'].get())
         email_dialog.columnconfigure(1, weight=1)
         def send():
+            # Read every Tk variable here; the worker thread must not touch Tk
             try:
-                msg = MIMEMultipart()
-                msg['Subject'] = subject.get()
-                msg['From'] = self.email_params['sender'].get()
-                msg['To'] = recipient.get()
-                msg.attach(MIMEText(message.get("1.0", tk.END), 'plain'))
-                file_path = self.file_path.get()
-                with open(file_path, "rb") as attachment:
-                    part = MIMEBase('application', 'octet-stream')
-                    part.set_payload(attachment.read())
-                    encoders.encode_base64(part)
-                    part.add_header('Content-Disposition', f'attachment; filename="{os.path.basename(file_path)}"')
-                    msg.attach(part)
-                server = smtplib.SMTP(
-                    self.email_params['smtp_server'].get(),
-                    self.email_params['smtp_port'].get()
-                )
-                server.starttls()
-                server.login(
-                    self.email_params['username'].get(),
-                    self.email_params['password'].get()
-                )
-                server.sendmail(
-                    self.email_params['sender'].get(),
-                    recipient.get(),
-                    msg.as_string()
-                )
-                server.quit()
-                messagebox.showinfo("Success", "Email sent successfully!")
-                email_dialog.destroy()
+                params = {k: v.get() for k, v in self.email_params.items()}
+            except tk.TclError as e:  # e.g. a non-numeric SMTP port
+                messagebox.showerror("Error", f"Failed to send email: {str(e)}")
+                return
+            params['file_path'] = self.file_path.get()
+            send_btn.config(state='disabled')
+            future = self._send_pool.submit(self.deliver_email, params, recipient.get(), subject.get(), message.get("1.0", tk.END))
+            future.add_done_callback(lambda f: self.post_to_ui(report, f))
+        def report(future):
+            try:
+                future.result()
             except Exception as e:
                 messagebox.showerror("Error", f"Failed to send email: {str(e)}")
-        ttk.Button(email_dialog, text="Send", command=send).grid(row=3, column=1, pady=10)
+                if email_dialog.winfo_exists():
+                    send_btn.config(state='normal')
+                return
+            messagebox.showinfo("Success", "Email sent successfully!")
+            email_dialog.destroy()
+        send_btn = ttk.Button(email_dialog, text="Send", command=send)
+        send_btn.grid(row=3, column=1, pady=10)
         ttk.Button(email_dialog, text="Cancel", command=email_dialog.destroy).grid(row=3, column=0, pady=10)
 
+    def deliver_email(self, params, recipient, subject, body):
+        # Runs on the send pool thread
+        msg = self.build_email(params, recipient, subject, body, params['file_path'])
+        failures = self.send_batch(params, [msg])
+        if failures:
+            raise failures[0][1]
+
+    def build_email(self, params, recipient, subject, body, file_path):
+        msg = EmailMessage()
+        msg['Subject'] = subject
+        msg['From'] = params['sender']
+        msg['To'] = recipient
+        msg.set_content(body)
+        # The attachment is attached already encoded; add_attachment() would
+        # re-encode it with the slower pure-Python base64 line splitter
+        part = MIMEPart()
+        part['Content-Type'] = 'application/octet-stream'
+        part['Content-Transfer-Encoding'] = 'base64'
+        part.add_header('Content-Disposition', 'attachment', filename=os.path.basename(file_path))
+        st = os.stat(file_path)
+        part.set_payload(_encoded_attachment(file_path, st.st_mtime_ns, st.st_size))
+        msg.make_mixed()
+        msg.attach(part)
+        return msg
+
+    def send_batch(self, params, messages):
+        # Sends a list of messages over one SMTP session; returns (message, error) for each one that failed.
+        # Recipients come from each message's To header.
+        failures = []
+        with self._smtp_lock:
+            server = self.get_smtp(params)
+            for i, msg in enumerate(messages):
+                try:
+                    # send_message flattens straight to CRLF bytes; as_string() would build a str copy first
+                    server.send_message(msg, from_addr=params['sender'])
+                except (smtplib.SMTPException, OSError) as e:
+                    failures.append((msg, e))
+                    # smtplib has already sent RSET; this only reconnects if the session died
+                    try:
+                        server = self.get_smtp(params)
+                    except (smtplib.SMTPException, OSError) as err:
+                        # No session for the rest of the batch
+                        failures.extend((rest, err) for rest in messages[i + 1:])
+                        break
+        return failures
+
+    def get_smtp(self, params):
+        # Reuse the logged-in session while the settings are unchanged and the server still answers NOOP
+        key = (params['smtp_server'], params['smtp_port'], params['username'], params['password'])
+        if self._smtp is not None:
+            if key == self._smtp_key:
+                try:
+                    if self._smtp.noop()[0] == 250:
+                        return self._smtp
+                except (smtplib.SMTPException, OSError):
+                    pass
+            self.close_smtp()
+        server = smtplib.SMTP(key[0], key[1], timeout=10)
+        try:
+            server.starttls()
+            server.login(key[2], key[3])
+        except Exception:
+            server.close()
+            raise
+        self._smtp = server
+        self._smtp_key = key
+        return server
+
+    def close_smtp(self):
+        if self._smtp is not None:
+            try:
+                self._smtp.quit()
+            except (smtplib.SMTPException, OSError):
+                self._smtp.close()
+            self._smtp = None
+            self._smtp_key = None
+
     def load_email_settings(self):
         try:
-            with open(self.email_settings_file, 'r') as f:
-                return json.load(f)
+            # Loaded once at startup; the (mtime, settings) record lets save skip no-op writes
+            mtime = os.stat(self.email_settings_file).st_mtime
+            with open(self.email_settings_file, 'r', encoding='utf-8') as f:
+                settings = json.load(f)
+            self._email_settings_cache = (mtime, settings)
+            return settings
         except FileNotFoundError:
             default_settings = {
                 'smtp_server': 'smtp.gmail.com',
@@ -732,8 +1070,9 @@ class BalanceLogger:
                 'default_subject': 'Weight Data Export',
                 'default_message': 'Please find attached the weight data export.'
             }
-            with open(self.email_settings_file, 'w') as f:
-                json.dump(default_settings, f, indent=2)
+            # Written on the first save rather than at startup
+            self._email_settings_cache = (None, default_settings)
+            self._email_settings_dirty = True
             return default_settings
         except Exception as e:
             messagebox.showerror("Settings Error", f"Failed to load email settings: {str(e)}")
@@ -741,40 +1080,20 @@ class BalanceLogger:
 
     def save_email_settings(self):
         try:
-            settings = {
-                'smtp_server': self.email_params['smtp_server'].get(),
-                'smtp_port': self.email_params['smtp_port'].get(),
-                'username': self.email_params['username'].get(),
-                'password': self.email_params['password'].get(),
-                'sender': self.email_params['sender'].get(),
-                'default_recipient': self.email_params['default_recipient'].get(),
-                'default_subject': self.email_params['default_subject'].get(),
-                'default_message': self.email_params['default_message'].get()
-            }
-            with open(self.email_settings_file, 'w') as f:
-                json.dump(settings, f, indent=2)
+            settings = {k: v.get() for k, v in self.email_params.items()}
+            cache = self._email_settings_cache
+            # Nothing to write if the file still holds exactly these settings
+            if (self._email_settings_dirty or cache is None or settings != cache[1]
+                    or not os.path.exists(self.email_settings_file)
+                    or os.stat(self.email_settings_file).st_mtime != cache[0]):
+                _write_json_atomic(self.email_settings_file, settings)
+                self._email_settings_dirty = False
+            self._email_settings_cache = (os.stat(self.email_settings_file).st_mtime, settings)
+            self.email_settings = settings
             messagebox.showinfo("Success", "Email settings saved successfully")
         except Exception as e:
             messagebox.showerror("Settings Error", f"Failed to save email settings: {str(e)}")
 
-    def create_help_messages(self):
-        self.help_texts = {
-            'presets': "Select a preconfigured scale profile.\nRight-click to manage presets.",
-            'com_port': "1. Connect scale via USB/RS232\n2. Click refresh (↻) to scan ports\n3. Select detected port",
-            'baud_rate': "Communication speed (bits per second)\nDefault: 9600 for Precisa",
-            'data_bits': "Number of data bits per character\nPrecisa: 7, Most devices: 8",
-            'parity': "Error checking method\nPrecisa: ODD, Common: NONE",
-            'flow_control': "Data flow management\nXON/XOFF: Software\nHARDWARE: RTS/CTS",
-            'export': "Export data to CSV\nAppends to existing file with timestamp",
-            'connection': "Connect/Disconnect from scale\nVerify parameters first",
-            'new_preset': "Create new preset from current settings",
-            'email': "Send data via email\nRequires SMTP server configuration",
-            'smtp_settings': "Configure email server settings\nFor Gmail, use an App Password"
-        }
-
-    def on_window_resize(self, event=None):
-        pass
-
 if __name__ == "__main__":
     root = tk.Tk()
     app = BalanceLogger(root)